@@ -3,14 +3,25 @@ MBTA Route Planner Agent - Real API Integration with LLM Location Extraction
 Plans routes between stops using real MBTA data, including transfers
 """
 
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from pydantic import BaseModel
 from typing import Dict, Any, Optional, List, Tuple
+import asyncio
+import bisect
+import difflib
+import functools
+import itertools
 import logging
 import os
-import requests
+import re
+import httpx
+import orjson
+from cachetools import LRUCache, TTLCache
 from datetime import datetime
+from uuid import uuid4
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 
 import sys
@@ -26,8 +37,28 @@ try:
 except Exception as e:
     log.warning(f"Could not setup telemetry: {e}")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup: build the in-memory transit graph in the background (refreshed hourly)
+    Shutdown: stop the refresh loop and background A2A tasks, close the MBTA client
+    """
+    refresh_task = asyncio.create_task(_refresh_transit_graph_loop())
+    yield
+    refresh_task.cancel()
+    for task in list(A2A_TASKS.values()):
+        task.cancel()
+    await mbta_client.aclose()
+
+
 # Initialize FastAPI
-app = FastAPI(title="mbta-planner-agent", version="1.0.0")
+app = FastAPI(
+    title="mbta-planner-agent",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 try:
     FastAPIInstrumentor.instrument_app(app)
 except Exception as e:
@@ -40,14 +71,73 @@ MBTA_BASE_URL = "https://api-v3.mbta.com"
 if not MBTA_API_KEY:
     log.warning("MBTA_API_KEY not found in environment variables!")
 
-# LLM Client
-try:
-    from src.exchange_agent.llm_client import get_llm_client
-    llm = get_llm_client()
-    log.info(f"✓ LLM provider: {llm.provider}")
-except RuntimeError as e:
-    llm = None
-    log.warning(f"LLM extraction disabled: {e}")
+# Shared async client so MBTA calls reuse pooled keep-alive (HTTP/2) connections
+mbta_client = httpx.AsyncClient(
+    base_url=MBTA_BASE_URL,
+    timeout=10.0,
+    headers={"x-api-key": MBTA_API_KEY} if MBTA_API_KEY else {},
+    transport=httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+    )
+)
+
+# Process-local caches — MBTA stop/route topology changes on the order of hours/days
+_mbta_cache = TTLCache(maxsize=4096, ttl=3600)
+_stations_cache = TTLCache(maxsize=1, ttl=86400)
+_cache_stats = {"hits": 0, "misses": 0}
+
+# Last validators per MBTA request: (path, params) -> (etag, last_modified, data)
+_conditional_cache = LRUCache(maxsize=4096)
+
+# Plans that found a route, keyed on normalized (origin, destination): (result, pre-serialized JSON)
+_plan_cache = TTLCache(maxsize=1024, ttl=3600)
+
+# Background A2A requests by task id, polled via /a2a/result/{task_id}.
+# Running tasks are held in a plain dict (the only strong reference, so they can't be
+# evicted or garbage-collected mid-run); finished ones move to a cache that expires unpolled results.
+# Process-local: with several workers, polls must reach the worker that accepted the task.
+A2A_TASKS: Dict[str, asyncio.Task] = {}
+A2A_RESULTS = TTLCache(maxsize=10000, ttl=600)
+A2A_MAX_RUNNING_TASKS = 100
+
+# How often the in-memory transit graph is rebuilt from the MBTA API
+GRAPH_REFRESH_INTERVAL = 3600
+
+# Retry backoff (seconds) while no graph has been built yet: doubles up to the max
+GRAPH_INITIAL_RETRY_DELAY = 5
+GRAPH_MAX_RETRY_DELAY = 300
+
+# Upper bound on concurrent MBTA requests while building the transit graph
+GRAPH_FETCH_CONCURRENCY = 16
+
+# Per-request retries (exponential backoff from 0.5s) for rate-limited / failing graph fetches
+GRAPH_FETCH_RETRIES = 4
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# LLM Client — created on first use, so startup and MBTA-only requests don't load a provider SDK
+from src.exchange_agent.llm_client import get_llm_client, LLMClient
+
+_llm: Optional[LLMClient] = None
+_llm_disabled = False
+
+
+def get_llm() -> Optional[LLMClient]:
+    """Return the shared LLM client, or None if no provider is configured or it fails to load."""
+    global _llm, _llm_disabled
+    if _llm is None and not _llm_disabled:
+        try:
+            _llm = get_llm_client()
+            log.info(f"✓ LLM provider: {_llm.provider}")
+        except Exception as e:
+            _llm_disabled = True
+            log.warning(f"LLM extraction disabled: {e}")
+    return _llm
+
+
+# LLM extraction results keyed on the normalized query, so repeat queries skip the LLM
+_extraction_cache = LRUCache(maxsize=2048)
 
 
 # ============================================================================
@@ -65,9 +155,16 @@ class A2AMessage(BaseModel):
 # ============================================================================
 
 async def extract_locations_with_llm(query: str) -> Tuple[Optional[str], Optional[str]]:
+    llm = get_llm()
     if not llm:
         return extract_locations_basic(query)
 
+    cache_key = " ".join(query.lower().split())
+    cached = _extraction_cache.get(cache_key)
+    if cached is not None:
+        log.info(f"LLM extraction cache hit: origin='{cached[0]}', destination='{cached[1]}'")
+        return cached
+
     prompt = f"""Extract the origin and destination locations from this transit query.
 
 Query: "{query}"
@@ -96,6 +193,7 @@ Response:"""
             origin = parts[0].strip() if parts[0].strip().lower() != "none" else None
             destination = parts[1].strip() if len(parts) > 1 and parts[1].strip().lower() != "none" else None
             log.info(f"LLM extracted: origin='{origin}', destination='{destination}'")
+            _extraction_cache[cache_key] = (origin, destination)
             return origin, destination
         return extract_locations_basic(query)
     except Exception as e:
@@ -103,62 +201,346 @@ Response:"""
         return extract_locations_basic(query)
 
 
-def extract_locations_basic(query: str) -> Tuple[Optional[str], Optional[str]]:
-    query_lower = query.lower()
-    origin = None
-    destination = None
-
-    if " from " in query_lower and " to " in query_lower:
-        parts = query_lower.split(" from ")
-        if len(parts) > 1:
-            from_part = parts[1]
-            to_parts = from_part.split(" to ")
-            if len(to_parts) >= 2:
-                origin = to_parts[0].strip()
-                destination = to_parts[1].strip()
-    elif " to " in query_lower:
-        parts = query_lower.split(" to ")
-        if len(parts) >= 2:
-            origin_part = parts[0].strip()
-            destination = parts[1].strip()
-            for word in ["how", "do", "i", "get", "go", "wanna", "want", "travel", "the"]:
-                origin_part = origin_part.replace(f" {word} ", " ").strip()
-            origin = origin_part
-
-    if origin:
-        origin = origin.strip("?.,!")
-    if destination:
-        destination = destination.strip("?.,!")
+# Fallback extraction patterns, matched against the lowercased query
+_FROM_TO_RE = re.compile(r"\bfrom\s+(?P<origin>.+?)\s+to\s+(?P<destination>.+?)[?.!,]*$")
+_TO_FROM_RE = re.compile(r"\bto\s+(?P<destination>.+?)\s+from\s+(?P<origin>.+?)[?.!,]*$")
+_TO_ONLY_RE = re.compile(r"^(?P<origin>.*?)\s*\bto\s+(?P<destination>.+?)[?.!,]*$")
+_FILLER_WORDS = frozenset({"how", "do", "i", "get", "go", "wanna", "want", "need", "travel", "the"})
+# Also "to", so "want to go to kenmore" split on its first "to" leaves "kenmore"
+_LEADING_FILLER_WORDS = _FILLER_WORDS | {"to"}
+
+
+def _strip_leading_fillers(text: str) -> str:
+    words = text.split()
+    i = 0
+    while i < len(words) and words[i] in _LEADING_FILLER_WORDS:
+        i += 1
+    return " ".join(words[i:])
 
+
+def extract_locations_basic(query: str) -> Tuple[Optional[str], Optional[str]]:
+    query_lower = query.lower().strip()
+    match = (
+        _FROM_TO_RE.search(query_lower)
+        or _TO_FROM_RE.search(query_lower)
+        or _TO_ONLY_RE.match(query_lower)
+    )
+    if not match:
+        return None, None
+
+    origin = match.group("origin")
+    if match.re is _TO_ONLY_RE:
+        origin = " ".join(w for w in origin.split() if w not in _FILLER_WORDS)
+    origin = origin.strip("?.,! ") or None
+    destination = _strip_leading_fillers(match.group("destination")).strip("?.,! ") or None
     return origin, destination
 
 
 # ============================================================================
-# MBTA API HELPERS
+# RESULT BUILDERS
 # ============================================================================
 
-def find_stop_by_name(name: str) -> Optional[Dict[str, Any]]:
-    try:
-        params = {
-            "api_key": MBTA_API_KEY,
-            "page[limit]": 500,
-            "filter[location_type]": "1"
+def route_summary(route: Dict[str, Any]) -> Dict[str, Any]:
+    attributes = route.get("attributes", {})
+    return {
+        "id": route.get("id"),
+        "name": attributes.get("long_name", attributes.get("short_name", "Unknown")),
+        "type": attributes.get("type"),
+        "color": attributes.get("color"),
+        "description": attributes.get("description")
+    }
+
+
+def transfer_summary(origin_route: Dict[str, Any], transfer_stop: Dict[str, Any],
+                     connecting_route: Dict[str, Any]) -> Dict[str, Any]:
+    origin_route_id = origin_route.get("id")
+    origin_route_name = origin_route.get("attributes", {}).get("long_name", origin_route_id)
+    transfer_stop_name = transfer_stop.get("attributes", {}).get("name", "Unknown")
+    connecting_route_id = connecting_route.get("id")
+    connecting_route_name = connecting_route.get("attributes", {}).get("long_name", connecting_route_id)
+
+    log.info(f"Found transfer at {transfer_stop_name}: {origin_route_name} → {connecting_route_name}")
+
+    return {
+        "origin_route": {
+            "id": origin_route_id,
+            "name": origin_route_name
+        },
+        "transfer_stop": {
+            "id": transfer_stop.get("id"),
+            "name": transfer_stop_name
+        },
+        "destination_route": {
+            "id": connecting_route_id,
+            "name": connecting_route_name
         }
-        log.info(f"Searching for stop: '{name}'")
-        response = requests.get(f"{MBTA_BASE_URL}/stops", params=params, timeout=10)
-        response.raise_for_status()
+    }
+
+
+# ============================================================================
+# IN-MEMORY TRANSIT GRAPH
+# ============================================================================
+
+_NO_ROUTES: frozenset = frozenset()
+
+
+class StopNameIndex:
+    """
+    Station lookup by name, built once per station list.
+    Tries an exact match, then a name prefix (bisect over sorted names), then a
+    substring, then a close fuzzy match; ties go to the earliest station in API order.
+    """
+
+    def __init__(self, stops: List[Dict[str, Any]]):
+        self.names = [stop.get("attributes", {}).get("name", "").lower() for stop in stops]
+        self.stops = stops
+        self.exact: Dict[str, int] = {}
+        for i, name in enumerate(self.names):
+            self.exact.setdefault(name, i)
+        self.sorted_names = sorted((name, i) for i, name in enumerate(self.names))
+
+    def __len__(self) -> int:
+        return len(self.stops)
+
+    def lookup(self, name_lower: str) -> Optional[Dict[str, Any]]:
+        if not name_lower:
+            return None
+
+        i = self.exact.get(name_lower)
+        if i is not None:
+            return self.stops[i]
+
+        start = bisect.bisect_left(self.sorted_names, (name_lower,))
+        prefix_matches = []
+        for name, i in itertools.islice(self.sorted_names, start, None):
+            if not name.startswith(name_lower):
+                break
+            prefix_matches.append(i)
+        if prefix_matches:
+            return self.stops[min(prefix_matches)]
+
+        for i, name in enumerate(self.names):
+            if name_lower in name:
+                return self.stops[i]
+
+        close = difflib.get_close_matches(name_lower, self.exact.keys(), n=1, cutoff=0.8)
+        if close:
+            return self.stops[self.exact[close[0]]]
+        return None
+
+
+@dataclass
+class TransitGraph:
+    """Stop/route adjacency for the whole network, so route search needs no HTTP calls."""
+    routes: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    stops: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    route_to_stops: Dict[str, List[str]] = field(default_factory=dict)
+    stop_to_routes: Dict[str, frozenset] = field(default_factory=dict)
+    stop_name_index: StopNameIndex = field(default_factory=lambda: StopNameIndex([]))
+    loaded_at: Optional[datetime] = None
+
+    def routes_between(self, origin_id: str, destination_id: str) -> List[Dict[str, Any]]:
+        common_route_ids = self.stop_to_routes.get(origin_id, _NO_ROUTES) & self.stop_to_routes.get(destination_id, _NO_ROUTES)
+        return [route_summary(r) for rid, r in self.routes.items() if rid in common_route_ids]
+
+    def find_transfer(self, origin_id: str, destination_id: str) -> Optional[Dict[str, Any]]:
+        origin_route_ids = self.stop_to_routes.get(origin_id, _NO_ROUTES)
+        dest_route_ids = self.stop_to_routes.get(destination_id, _NO_ROUTES)
+
+        for origin_route_id, origin_route in self.routes.items():
+            if origin_route_id not in origin_route_ids:
+                continue
+            for transfer_stop_id in self.route_to_stops.get(origin_route_id, []):
+                transfer_route_ids = self.stop_to_routes.get(transfer_stop_id, _NO_ROUTES)
+                # isdisjoint short-circuits without allocating; only build the intersection on a hit
+                if not transfer_route_ids.isdisjoint(dest_route_ids):
+                    connecting_route_id = next(iter(transfer_route_ids & dest_route_ids))
+                    connecting_route = self.routes[connecting_route_id]
+                    transfer_stop = self.stops.get(transfer_stop_id, {"id": transfer_stop_id})
+                    return transfer_summary(origin_route, transfer_stop, connecting_route)
+
+        return None
+
+
+transit_graph: Optional[TransitGraph] = None
 
-        stops = response.json().get("data", [])
-        name_lower = name.lower().strip()
-        matching_stops = []
 
+async def fetch_graph_data(path: str, params: Optional[Dict[str, Any]] = None,
+                           semaphore: Optional[asyncio.Semaphore] = None) -> List[Dict[str, Any]]:
+    """
+    fetch_mbta_data with retries on 429/5xx and transport errors, honouring Retry-After.
+    Raises once GRAPH_FETCH_RETRIES is exhausted, or when Retry-After exceeds
+    GRAPH_MAX_RETRY_DELAY (left to the refresh loop's backoff). Backoff sleeps happen outside `semaphore`.
+    """
+    delay = 0.5
+    for attempt in range(GRAPH_FETCH_RETRIES + 1):
+        try:
+            if semaphore is None:
+                return await fetch_mbta_data(path, params)
+            async with semaphore:
+                return await fetch_mbta_data(path, params)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code not in RETRYABLE_STATUS_CODES or attempt == GRAPH_FETCH_RETRIES:
+                raise
+            retry_after = e.response.headers.get("retry-after", "")
+            wait = max(delay, float(retry_after)) if retry_after.isdigit() else delay
+            if wait > GRAPH_MAX_RETRY_DELAY:
+                raise
+        except httpx.TransportError:
+            if attempt == GRAPH_FETCH_RETRIES:
+                raise
+            wait = delay
+
+        log.warning(f"MBTA fetch {path} {params} failed (attempt {attempt + 1}), retrying in {wait:.1f}s")
+        await asyncio.sleep(wait)
+        delay *= 2
+
+
+async def _gather_or_cancel(*coros) -> List[Any]:
+    """Like asyncio.gather, but the first failure cancels and awaits the rest before re-raising it."""
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(coro) for coro in coros]
+    except ExceptionGroup as eg:
+        raise eg.exceptions[0] from None
+    return [task.result() for task in tasks]
+
+
+async def build_transit_graph() -> TransitGraph:
+    """Fetch all routes, stations and route→station membership from the MBTA API."""
+    started = datetime.now()
+    graph = TransitGraph()
+
+    routes, stations = await _gather_or_cancel(
+        fetch_graph_data("/routes"),
+        fetch_graph_data("/stops", {"page[limit]": 500, "filter[location_type]": "1"})
+    )
+    for route in routes:
+        graph.routes[route.get("id")] = route
+    for stop in stations:
+        graph.stops[stop.get("id")] = stop
+    graph.stop_name_index = StopNameIndex(stations)
+
+    semaphore = asyncio.Semaphore(GRAPH_FETCH_CONCURRENCY)
+
+    async def fetch_route_stops(route_id: str) -> Tuple[str, List[Dict[str, Any]]]:
+        params = {"filter[route]": route_id, "filter[location_type]": "1"}
+        return route_id, await fetch_graph_data("/stops", params, semaphore)
+
+    route_stops = await _gather_or_cancel(*[fetch_route_stops(route_id) for route_id in graph.routes])
+
+    stop_to_routes: Dict[str, set] = {}
+    for route_id, stops in route_stops:
+        graph.route_to_stops[route_id] = [s.get("id") for s in stops]
         for stop in stops:
-            stop_name = stop.get("attributes", {}).get("name", "").lower()
-            if name_lower in stop_name:
-                matching_stops.append(stop)
+            graph.stops.setdefault(stop.get("id"), stop)
+            stop_to_routes.setdefault(stop.get("id"), set()).add(route_id)
+    graph.stop_to_routes = {stop_id: frozenset(route_ids) for stop_id, route_ids in stop_to_routes.items()}
+
+    graph.loaded_at = datetime.now()
+    log.info(f"Transit graph built: {len(graph.routes)} routes, {len(graph.stops)} stations "
+             f"in {(graph.loaded_at - started).total_seconds():.1f}s")
+    return graph
+
+
+async def _refresh_transit_graph_loop():
+    global transit_graph
+    retry_delay = GRAPH_INITIAL_RETRY_DELAY
+    while True:
+        try:
+            transit_graph = await build_transit_graph()
+        except Exception as e:
+            log.error(f"Transit graph refresh failed, keeping previous graph: {e}")
+
+        if transit_graph is None:
+            # Nothing to fall back on but the HTTP path, so retry soon rather than in an hour
+            log.info(f"Retrying transit graph build in {retry_delay}s")
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, GRAPH_MAX_RETRY_DELAY)
+        else:
+            await asyncio.sleep(GRAPH_REFRESH_INTERVAL)
+
+
+# ============================================================================
+# MBTA API HELPERS
+# ============================================================================
+
+def ttl_cached(cache: TTLCache):
+    """Memoize an async MBTA helper in `cache`, keyed on (function name, *args).
 
-        if matching_stops:
-            stop = matching_stops[0]
+    Empty results are not cached, since the helpers return them on API errors.
+    Concurrent misses for the same key share a single in-flight request.
+    """
+    def decorator(func):
+        in_flight: Dict[tuple, asyncio.Future] = {}
+
+        @functools.wraps(func)
+        async def wrapper(*args):
+            key = (func.__name__, *args)
+            cached = cache.get(key)
+            if cached is not None:
+                _cache_stats["hits"] += 1
+                return cached
+
+            pending = in_flight.get(key)
+            if pending is None:
+                _cache_stats["misses"] += 1
+                pending = in_flight[key] = asyncio.ensure_future(func(*args))
+                pending.add_done_callback(lambda _: in_flight.pop(key, None))
+
+            # Shielded so a cancelled caller doesn't cancel the request for the others
+            result = await asyncio.shield(pending)
+            if result:
+                cache[key] = result
+            return result
+        return wrapper
+    return decorator
+
+
+async def fetch_mbta_data(path: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    GET an MBTA v3 endpoint and return its JSON:API `data` list. Raises on HTTP errors.
+    Repeat requests are sent as conditional GETs; a 304 reuses the previously parsed data.
+    """
+    key = (path, tuple(sorted((params or {}).items())))
+    headers = {}
+    previous = _conditional_cache.get(key)
+    if previous is not None:
+        etag, last_modified, _ = previous
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    response = await mbta_client.get(path, params=params, headers=headers)
+    if response.status_code == 304 and previous is not None:
+        return previous[2]
+    response.raise_for_status()
+
+    data = orjson.loads(response.content).get("data", [])
+    etag = response.headers.get("etag")
+    last_modified = response.headers.get("last-modified")
+    if etag or last_modified:
+        _conditional_cache[key] = (etag, last_modified, data)
+    return data
+
+
+@ttl_cached(_stations_cache)
+async def get_station_name_index() -> StopNameIndex:
+    """Get a name index over all parent stations (location_type 1)."""
+    return StopNameIndex(await fetch_mbta_data("/stops", {"page[limit]": 500, "filter[location_type]": "1"}))
+
+
+async def find_stop_by_name(name: str) -> Optional[Dict[str, Any]]:
+    try:
+        log.info(f"Searching for stop: '{name}'")
+        if transit_graph:
+            name_index = transit_graph.stop_name_index
+        else:
+            name_index = await get_station_name_index()
+
+        stop = name_index.lookup(name.lower().strip())
+        if stop:
             attributes = stop.get("attributes", {})
             log.info(f"Found stop: {attributes.get('name')}")
             return {
@@ -175,124 +557,83 @@ def find_stop_by_name(name: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-def get_routes_for_stop(stop_id: str) -> List[Dict[str, Any]]:
+@ttl_cached(_mbta_cache)
+async def get_routes_for_stop(stop_id: str) -> List[Dict[str, Any]]:
     """Get all routes serving a given stop."""
     try:
-        params = {
-            "api_key": MBTA_API_KEY,
-            "filter[stop]": stop_id
-        }
-        response = requests.get(f"{MBTA_BASE_URL}/routes", params=params, timeout=10)
-        response.raise_for_status()
-        return response.json().get("data", [])
+        return await fetch_mbta_data("/routes", {"filter[stop]": stop_id})
     except Exception as e:
         log.error(f"Error getting routes for stop {stop_id}: {e}")
         return []
 
 
-def get_stops_for_route(route_id: str) -> List[Dict[str, Any]]:
+@ttl_cached(_mbta_cache)
+async def get_stops_for_route(route_id: str) -> List[Dict[str, Any]]:
     """Get all stops on a given route."""
     try:
-        params = {
-            "api_key": MBTA_API_KEY,
-            "filter[route]": route_id,
-            "filter[location_type]": "1"
-        }
-        response = requests.get(f"{MBTA_BASE_URL}/stops", params=params, timeout=10)
-        response.raise_for_status()
-        return response.json().get("data", [])
+        return await fetch_mbta_data("/stops", {"filter[route]": route_id, "filter[location_type]": "1"})
     except Exception as e:
         log.error(f"Error getting stops for route {route_id}: {e}")
         return []
 
 
-def get_routes_between_stops(origin_id: str, destination_id: str) -> List[Dict[str, Any]]:
+async def get_routes_between_stops(origin_id: str, destination_id: str) -> List[Dict[str, Any]]:
     """Find direct routes serving both stops."""
+    if transit_graph:
+        return transit_graph.routes_between(origin_id, destination_id)
+
     try:
-        origin_routes = get_routes_for_stop(origin_id)
-        origin_route_ids = {r.get("id") for r in origin_routes}
-
-        dest_routes = get_routes_for_stop(destination_id)
-        dest_route_ids = {r.get("id") for r in dest_routes}
-
-        common_route_ids = origin_route_ids.intersection(dest_route_ids)
-
-        common_routes = []
-        for route in origin_routes:
-            if route.get("id") in common_route_ids:
-                attributes = route.get("attributes", {})
-                common_routes.append({
-                    "id": route.get("id"),
-                    "name": attributes.get("long_name", attributes.get("short_name", "Unknown")),
-                    "type": attributes.get("type"),
-                    "color": attributes.get("color"),
-                    "description": attributes.get("description")
-                })
-
-        return common_routes
+        origin_routes, dest_routes = await asyncio.gather(
+            get_routes_for_stop(origin_id),
+            get_routes_for_stop(destination_id)
+        )
+        dest_route_ids = frozenset(r.get("id") for r in dest_routes)
+        return [route_summary(r) for r in origin_routes if r.get("id") in dest_route_ids]
     except Exception as e:
         log.error(f"Error finding routes: {e}")
         return []
 
 
-def find_transfer_routes(origin_id: str, destination_id: str) -> Optional[Dict[str, Any]]:
+async def find_transfer_routes(origin_id: str, destination_id: str) -> Optional[Dict[str, Any]]:
     """
     Find a one-transfer route between origin and destination.
     
     Strategy:
-    1. Get all routes from origin
-    2. Get all routes from destination  
-    3. For each origin route, get all its stops
-    4. For each of those stops, check if any destination route also serves it
-    5. That stop is the transfer point
+    1. Get all routes from origin and destination (concurrently)
+    2. Get the stops of every origin and destination route (concurrently)
+    3. The first stop (in origin route order) that is also on a destination route
+       is the transfer point
+
+    Uses the in-memory transit graph instead when it has been loaded.
     """
-    try:
-        origin_routes = get_routes_for_stop(origin_id)
-        dest_routes = get_routes_for_stop(destination_id)
+    if transit_graph:
+        return transit_graph.find_transfer(origin_id, destination_id)
 
-        dest_route_ids = {r.get("id") for r in dest_routes}
-        dest_route_map = {r.get("id"): r for r in dest_routes}
+    try:
+        origin_routes, dest_routes = await asyncio.gather(
+            get_routes_for_stop(origin_id),
+            get_routes_for_stop(destination_id)
+        )
 
         log.info(f"Looking for transfers: {len(origin_routes)} origin routes, {len(dest_routes)} dest routes")
 
-        for origin_route in origin_routes:
-            origin_route_id = origin_route.get("id")
-            origin_route_name = origin_route.get("attributes", {}).get("long_name", origin_route_id)
+        # Get the stops of every origin and destination route in one concurrent batch
+        stops_per_route = await asyncio.gather(
+            *[get_stops_for_route(r.get("id")) for r in origin_routes + dest_routes]
+        )
+        stops_per_origin_route = stops_per_route[:len(origin_routes)]
 
-            # Get all stops on this origin route
-            stops_on_origin_route = get_stops_for_route(origin_route_id)
+        # Invert the destination routes' stop lists: stop id -> destination routes serving it
+        dest_routes_at_stop: Dict[str, List[Dict[str, Any]]] = {}
+        for dest_route, stops in zip(dest_routes, stops_per_route[len(origin_routes):]):
+            for stop in stops:
+                dest_routes_at_stop.setdefault(stop.get("id"), []).append(dest_route)
 
+        for origin_route, stops_on_origin_route in zip(origin_routes, stops_per_origin_route):
             for transfer_stop in stops_on_origin_route:
-                transfer_stop_id = transfer_stop.get("id")
-                transfer_stop_name = transfer_stop.get("attributes", {}).get("name", "Unknown")
-
-                # Check if any destination route also serves this stop
-                transfer_routes = get_routes_for_stop(transfer_stop_id)
-                transfer_route_ids = {r.get("id") for r in transfer_routes}
-
-                connecting_route_ids = transfer_route_ids.intersection(dest_route_ids)
-
-                if connecting_route_ids:
-                    connecting_route_id = list(connecting_route_ids)[0]
-                    connecting_route = dest_route_map.get(connecting_route_id, {})
-                    connecting_route_name = connecting_route.get("attributes", {}).get("long_name", connecting_route_id)
-
-                    log.info(f"Found transfer at {transfer_stop_name}: {origin_route_name} → {connecting_route_name}")
-
-                    return {
-                        "origin_route": {
-                            "id": origin_route_id,
-                            "name": origin_route_name
-                        },
-                        "transfer_stop": {
-                            "id": transfer_stop_id,
-                            "name": transfer_stop_name
-                        },
-                        "destination_route": {
-                            "id": connecting_route_id,
-                            "name": connecting_route_name
-                        }
-                    }
+                connecting_routes = dest_routes_at_stop.get(transfer_stop.get("id"))
+                if connecting_routes:
+                    return transfer_summary(origin_route, transfer_stop, connecting_routes[0])
 
         return None
     except Exception as e:
@@ -304,11 +645,14 @@ def find_transfer_routes(origin_id: str, destination_id: str) -> Optional[Dict[s
 # ROUTE PLANNING
 # ============================================================================
 
-def plan_route(origin: str, destination: str) -> Dict[str, Any]:
+async def plan_route(origin: str, destination: str) -> Dict[str, Any]:
     try:
         log.info(f"Planning route from '{origin}' to '{destination}'")
 
-        origin_stop = find_stop_by_name(origin)
+        origin_stop, dest_stop = await asyncio.gather(
+            find_stop_by_name(origin),
+            find_stop_by_name(destination)
+        )
         if not origin_stop:
             return {
                 "ok": False,
@@ -316,7 +660,6 @@ def plan_route(origin: str, destination: str) -> Dict[str, Any]:
                 "text": f"Sorry, I couldn't find a stop matching '{origin}'. Please check the name and try again."
             }
 
-        dest_stop = find_stop_by_name(destination)
         if not dest_stop:
             return {
                 "ok": False,
@@ -326,10 +669,13 @@ def plan_route(origin: str, destination: str) -> Dict[str, Any]:
 
         log.info(f"Found stops — Origin: {origin_stop['name']}, Destination: {dest_stop['name']}")
 
-        # Try direct routes first
-        direct_routes = get_routes_between_stops(origin_stop["id"], dest_stop["id"])
+        # Start the transfer search speculatively alongside the direct check, so a
+        # transfer answer costs the slower of the two searches rather than their sum
+        transfer_task = asyncio.create_task(find_transfer_routes(origin_stop["id"], dest_stop["id"]))
+        direct_routes = await get_routes_between_stops(origin_stop["id"], dest_stop["id"])
 
         if direct_routes:
+            transfer_task.cancel()
             if len(direct_routes) == 1:
                 route = direct_routes[0]
                 text = f"Take the {route['name']} from {origin_stop['name']} to {dest_stop['name']}."
@@ -348,8 +694,8 @@ def plan_route(origin: str, destination: str) -> Dict[str, Any]:
             }
 
         # No direct route — look for one-transfer option
-        log.info("No direct route found, searching for transfer options...")
-        transfer = find_transfer_routes(origin_stop["id"], dest_stop["id"])
+        log.info("No direct route found, waiting on transfer search...")
+        transfer = await transfer_task
 
         if transfer:
             text = (
@@ -377,7 +723,7 @@ def plan_route(origin: str, destination: str) -> Dict[str, Any]:
             "text": f"No route found between {origin_stop['name']} and {dest_stop['name']}. You may need multiple transfers — consider checking the MBTA Trip Planner at mbta.com."
         }
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         log.error(f"MBTA API request failed: {e}")
         return {
             "ok": False,
@@ -393,38 +739,64 @@ def plan_route(origin: str, destination: str) -> Dict[str, Any]:
         }
 
 
+async def plan_route_cached(origin: str, destination: str) -> Tuple[Dict[str, Any], bytes]:
+    """plan_route memoized on the normalized stop names, returning the result and its JSON bytes."""
+    key = (" ".join((origin or "").lower().split()), " ".join((destination or "").lower().split()))
+    cached = _plan_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = await plan_route(origin=origin, destination=destination)
+    entry = (result, orjson.dumps(result))
+    # "No route found" can come from MBTA errors swallowed by the HTTP helpers, so only
+    # plans that found a route are cached
+    if result.get("ok") and result.get("transfers") is not None:
+        _plan_cache[key] = entry
+    return entry
+
+
 # ============================================================================
 # ENDPOINTS
 # ============================================================================
 
 @app.get("/health")
-def health():
+async def health():
     return {
         "ok": True,
         "service": "mbta-planner-agent",
         "version": "1.0.0",
         "mbta_api_configured": bool(MBTA_API_KEY),
-        "llm_extraction_available": llm is not None,
-        "llm_provider": llm.provider if llm else None
+        "llm_initialized": _llm is not None,
+        "llm_provider": _llm.provider if _llm else None,
+        "transit_graph": {
+            "loaded": transit_graph is not None,
+            "routes": len(transit_graph.routes) if transit_graph else 0,
+            "stops": len(transit_graph.stops) if transit_graph else 0,
+            "loaded_at": transit_graph.loaded_at.isoformat() if transit_graph else None
+        },
+        "mbta_cache": {
+            "hits": _cache_stats["hits"],
+            "misses": _cache_stats["misses"],
+            "size": len(_mbta_cache) + len(_stations_cache)
+        },
+        "plan_cache_size": len(_plan_cache)
     }
 
 
 @app.get("/plan")
-def plan_route_endpoint(
+async def plan_route_endpoint(
     origin: str = Query(..., description="Origin stop name"),
     destination: str = Query(..., description="Destination stop name")
 ):
     try:
-        return plan_route(origin=origin, destination=destination)
+        _, body = await plan_route_cached(origin=origin, destination=destination)
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         log.error(f"Error in /plan endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/a2a/message")
-async def a2a_message(message: A2AMessage):
-    log.info(f"Received A2A message: type={message.type}")
-
+async def process_a2a_message(message: A2AMessage) -> Dict[str, Any]:
     try:
         if message.type == "request":
             payload = message.payload
@@ -455,7 +827,7 @@ async def a2a_message(message: A2AMessage):
                     "metadata": {"status": "partial", "agent": "mbta-planner-agent"}
                 }
 
-            result = plan_route(origin=origin, destination=destination)
+            result, _ = await plan_route_cached(origin=origin, destination=destination)
 
             return {
                 "type": "response",
@@ -465,7 +837,7 @@ async def a2a_message(message: A2AMessage):
                     "agent": "mbta-planner-agent",
                     "origin_parsed": origin,
                     "destination_parsed": destination,
-                    "llm_provider": llm.provider if llm else "none",
+                    "llm_provider": _llm.provider if _llm else "none",
                     "timestamp": datetime.now().isoformat()
                 }
             }
@@ -485,8 +857,57 @@ async def a2a_message(message: A2AMessage):
         }
 
 
+def _a2a_task_done(task_id: str, task: asyncio.Task):
+    A2A_TASKS.pop(task_id, None)
+    A2A_RESULTS[task_id] = task
+
+
+@app.post("/a2a/message")
+async def a2a_message(message: A2AMessage):
+    """
+    Handle an A2A message. Requests with metadata {"async": true} are planned in the
+    background and answered immediately with a task id to poll at /a2a/result/{task_id};
+    past A2A_MAX_RUNNING_TASKS in flight they are rejected with 429.
+    """
+    log.info(f"Received A2A message: type={message.type}")
+
+    if message.type == "request" and message.metadata.get("async"):
+        if len(A2A_TASKS) >= A2A_MAX_RUNNING_TASKS:
+            raise HTTPException(status_code=429, detail="Too many background requests in progress, retry later")
+
+        task_id = str(uuid4())
+        task = asyncio.create_task(process_a2a_message(message))
+        A2A_TASKS[task_id] = task
+        task.add_done_callback(functools.partial(_a2a_task_done, task_id))
+        return {
+            "type": "accepted",
+            "payload": {"task_id": task_id},
+            "metadata": {"status": "pending", "agent": "mbta-planner-agent"}
+        }
+
+    return await process_a2a_message(message)
+
+
+@app.get("/a2a/result/{task_id}")
+async def a2a_result(task_id: str):
+    if task_id in A2A_TASKS:
+        return {"task_id": task_id, "status": "pending"}
+
+    task = A2A_RESULTS.pop(task_id, None)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired task: {task_id}")
+
+    if task.cancelled():
+        return {
+            "type": "error",
+            "payload": {"text": "The request was cancelled before it completed. Please try again."},
+            "metadata": {"status": "error"}
+        }
+    return task.result()
+
+
 @app.post("/mcp/tools/list")
-def mcp_tools_list():
+async def mcp_tools_list():
     return {
         "tools": [
             {
@@ -506,12 +927,12 @@ def mcp_tools_list():
 
 
 @app.post("/mcp/tools/call")
-def mcp_tools_call(request: Dict[str, Any]):
+async def mcp_tools_call(request: Dict[str, Any]):
     tool_name = request.get("name")
     arguments = request.get("arguments", {})
 
     if tool_name == "plan_mbta_trip":
-        result = plan_route(
+        result, _ = await plan_route_cached(
             origin=arguments.get("origin"),
             destination=arguments.get("destination")
         )
@@ -0,0 +1,22 @@
+#!/bin/sh
+# ============================================================================
+# MBTA Planner Agent - multi-worker HTTP server
+# ============================================================================
+# Runs the planner under gunicorn with one uvicorn worker (one event loop)
+# per process. Each worker builds its own transit graph (~200 MBTA requests,
+# hourly) and caches, so MBTA load and memory scale with the worker count;
+# size WEB_CONCURRENCY to the container's CPU/memory limits, not the node
+# (nproc reports node cores, not the pod's CPU quota). Background A2A tasks
+# (/a2a/result) are only visible to the worker that accepted them.
+#
+#   PORT             Listen port (default: 8002)
+#   WEB_CONCURRENCY  Worker processes (default: 2)
+# ============================================================================
+
+set -e
+
+exec gunicorn src.agents.planner.main:app \
+    -k uvicorn.workers.UvicornWorker \
+    -w "${WEB_CONCURRENCY:-2}" \
+    --bind "0.0.0.0:${PORT:-8002}" \
+    --timeout 30
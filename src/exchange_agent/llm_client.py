@@ -4,7 +4,6 @@ Supports Anthropic and OpenAI — auto-detects based on available API keys.
 Override with LLM_PROVIDER env var: "anthropic" or "openai"
 """
 import os
-import asyncio
 from typing import Optional
 
 
@@ -30,16 +29,15 @@ class LLMClient:
     def _init_client(self):
         if self.provider == "anthropic":
             import anthropic
-            return anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+            return anthropic.AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
         else:
-            from openai import OpenAI
-            return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+            from openai import AsyncOpenAI
+            return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
     async def complete(self, system: str, user: str, max_tokens: int = 500, temperature: float = 0.7) -> str:
         """Single unified interface for both providers."""
         if self.provider == "anthropic":
-            response = await asyncio.to_thread(
-                self.client.messages.create,
+            response = await self.client.messages.create(
                 model=os.getenv("ANTHROPIC_MODEL", "claude-sonnet-4-20250514"),
                 max_tokens=max_tokens,
                 system=system,
@@ -47,8 +45,7 @@ class LLMClient:
             )
             return response.content[0].text.strip()
         else:
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
+            response = await self.client.chat.completions.create(
                 model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
                 messages=[
                     {"role": "system", "content": system},